@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Shared loading and aggregation of the per-protein genome statistics files.
+
+Used by update_comprehensive_summary.py and update_summary_files.py; run this
+module directly to write all summary files from a single pass.
+"""
+
+import numpy as np
+import pandas as pd
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from _table_io import write_delimited
+try:
+    import pyarrow as pa
+except ImportError:  # optional: parquet cache of the statistics files
+    pa = None
+try:
+    import numba
+except ImportError:  # optional: compiled group sums in compute_summaries
+    numba = None
+
+STATS_SUFFIX = '_genome_statistics.tsv'
+# Summary files written next to the statistics files
+GENOME_SUMMARY_FILE = 'genome_performance_summary.tsv'
+PROTEIN_SUMMARY_FILE = 'protein_families_summary.tsv'
+COMPREHENSIVE_SUMMARY_FILE = 'comprehensive_summary.txt'
+# Parsed statistics files are cached as Parquet in this subdirectory, keyed on path and mtime
+STATS_CACHE_DIR = '.cache'
+
+# Count columns summed per protein family and per genome; avg_identity is averaged
+SUM_COLUMNS = [
+    'total_queries',
+    'queries_with_hits',
+    'high_significance',
+    'medium_significance',
+    'low_significance',
+    'very_low_significance',
+    'not_found'
+]
+# Column types of the statistics files; counts are written as floats (e.g. 5.0)
+# but always hold whole numbers
+STATS_DTYPES = {
+    'total_queries': 'uint32',
+    'queries_with_hits': 'uint32',
+    'high_significance': 'uint32',
+    'medium_significance': 'uint32',
+    'low_significance': 'uint32',
+    'very_low_significance': 'uint32',
+    'not_found': 'uint32',
+    'avg_identity': 'float64'
+}
+# Summary column name for each statistics column
+SUMMARY_COLUMNS = {
+    'total_queries': 'Total_Queries',
+    'queries_with_hits': 'Total_Hits',
+    'high_significance': 'HIGH_Orthologs',
+    'medium_significance': 'MEDIUM_Homologs',
+    'low_significance': 'LOW_Possible',
+    'very_low_significance': 'VERY_LOW',
+    'not_found': 'NOT_FOUND',
+    'avg_identity': 'Avg_Identity_%'
+}
+
+def _stats_files_key(stats_dir):
+    """Return a (path, mtime, size) tuple for every statistics file in stats_dir."""
+    # One directory scan; the suffix test replaces glob's pattern matching
+    with os.scandir(stats_dir) as entries:
+        key = []
+        for entry in entries:
+            if entry.name.endswith(STATS_SUFFIX) and entry.is_file():
+                stat = entry.stat()
+                key.append((entry.path, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(key))
+
+def _stats_cache_prefix(file):
+    """Parquet cache path prefix shared by all cached versions of a statistics file."""
+    key = hashlib.sha1(os.path.abspath(file).encode()).hexdigest()
+    return os.path.join(os.path.dirname(file), STATS_CACHE_DIR, f"{key}_")
+
+def _stats_cache_file(file, mtime_ns):
+    """Parquet cache path for a statistics file at a given modification time."""
+    return f"{_stats_cache_prefix(file)}{mtime_ns}.parquet"
+
+def _remove_stale_cache_files(file, cache_file):
+    """Delete the cached versions of a statistics file other than cache_file."""
+    prefix = os.path.basename(_stats_cache_prefix(file))
+    with os.scandir(os.path.dirname(cache_file)) as entries:
+        for entry in entries:
+            if entry.name.startswith(prefix) and entry.path != cache_file:
+                os.remove(entry.path)
+
+def _load_stats_file(file_key):
+    """Read one statistics file and tag its rows with the protein family."""
+    file, mtime_ns, _ = file_key
+    cache_file = _stats_cache_file(file, mtime_ns)
+    if pa is not None and os.path.exists(cache_file):
+        try:
+            return pd.read_parquet(cache_file)
+        except (OSError, pa.ArrowException):
+            pass
+    protein = os.path.basename(file).replace(STATS_SUFFIX, '')
+    df = pd.read_csv(file, sep='\t', index_col=0, dtype=STATS_DTYPES)
+    df['protein_family'] = pd.Categorical([protein] * len(df), categories=[protein])
+    # The cache is best effort
+    if pa is not None:
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            df.to_parquet(cache_file, compression='zstd')
+            _remove_stale_cache_files(file, cache_file)
+        except (OSError, pa.ArrowException):
+            pass
+    return df
+
+@lru_cache(maxsize=4)
+def _load_combined_stats(files_key):
+    # The files are independent; read_csv releases the GIL while parsing
+    with ThreadPoolExecutor(max_workers=min(32, len(files_key) or 1)) as executor:
+        all_stats = list(executor.map(_load_stats_file, files_key))
+    combined_stats = pd.concat(all_stats)
+    # Each file has its own single category; unify them so groupby runs on integer codes
+    combined_stats['protein_family'] = combined_stats['protein_family'].astype('category')
+    return combined_stats
+
+def load_combined_stats(stats_dir='analysis_output'):
+    """
+    Read and concatenate all genome statistics files in a directory.
+
+    The parsed frame is cached on the files' paths, modification times and
+    sizes, so repeated calls reuse it until a file changes.
+
+    Args:
+        stats_dir (str): Directory containing the *_genome_statistics.tsv files
+
+    Returns:
+        pd.DataFrame: Statistics indexed by genome, with a protein_family column
+    """
+    return _load_combined_stats(_stats_files_key(stats_dir))
+
+def _group_sums_python(codes, values, n_groups):
+    """Column sums of values per group code; every code in range(n_groups) must occur."""
+    if codes.size == 0:
+        return np.zeros((n_groups, values.shape[1]), dtype=values.dtype)
+    # Sort rows by group (stable, so rows keep their order within a group) and reduce
+    # each contiguous block in one np.add.reduceat call
+    order = np.argsort(codes, kind='stable')
+    starts = np.searchsorted(codes[order], np.arange(n_groups))
+    return np.add.reduceat(values[order], starts, axis=0)
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _group_sums(codes, values, n_groups):
+        # One fused pass over the rows (serial: parallel row updates would race on sums)
+        sums = np.zeros((n_groups, values.shape[1]), dtype=values.dtype)
+        for i in range(codes.size):
+            for j in range(values.shape[1]):
+                sums[codes[i], j] += values[i, j]
+        return sums
+else:
+    _group_sums = _group_sums_python
+
+def _aggregate(combined_stats, codes, n_groups):
+    """Sum the count columns and average avg_identity (skipping NaN) per group code."""
+    counts = _group_sums(codes, combined_stats[SUM_COLUMNS].to_numpy(dtype=np.int64), n_groups)
+    identity = combined_stats['avg_identity'].to_numpy(dtype=np.float64)
+    has_identity = ~np.isnan(identity)
+    identity_sums = _group_sums(codes, np.where(has_identity, identity, 0.0)[:, None], n_groups)[:, 0]
+    identity_counts = _group_sums(codes, has_identity.astype(np.int64)[:, None], n_groups)[:, 0]
+    summary = pd.DataFrame(counts, columns=[SUMMARY_COLUMNS[column] for column in SUM_COLUMNS])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        summary['Avg_Identity_%'] = identity_sums / identity_counts
+    return summary
+
+def _hit_rate(summary):
+    """Percentage of queries with hits, 0 where there were no queries."""
+    return (summary['Total_Hits'] / summary['Total_Queries'] * 100).where(summary['Total_Queries'] > 0, 0)
+
+def compute_summaries(combined_stats):
+    """
+    Aggregate the combined statistics per protein family and per genome.
+
+    Rows are factorized into group codes once per axis and reduced with
+    _group_sums, which is compiled with Numba when it is installed.
+
+    Args:
+        combined_stats (pd.DataFrame): Result of load_combined_stats
+
+    Returns:
+        tuple: (protein_df, genome_df) with the columns of
+            protein_families_summary.tsv and genome_performance_summary.tsv
+    """
+    genome_codes, genomes = pd.factorize(combined_stats.index, sort=True)
+    genome_df = _aggregate(combined_stats, genome_codes, len(genomes))
+    genome_df['Proteins_Analyzed'] = np.bincount(genome_codes, minlength=len(genomes))
+    genome_df['Hit_Rate_%'] = _hit_rate(genome_df)
+    genome_df.index = pd.Index(genomes)
+
+    protein_codes, proteins = pd.factorize(combined_stats['protein_family'], sort=True)
+    protein_df = _aggregate(combined_stats, protein_codes, len(proteins))
+    protein_df.insert(0, 'Protein_Family', pd.Categorical(proteins))
+    protein_df.insert(3, 'Hit_Rate_%', _hit_rate(protein_df))
+    return protein_df, genome_df
+
+def outputs_up_to_date(outputs, stats_dir='analysis_output'):
+    """
+    Check whether summary outputs are newer than every statistics file.
+
+    Args:
+        outputs (list): Paths of the files written from the statistics
+        stats_dir (str): Directory containing the *_genome_statistics.tsv files
+
+    Returns:
+        bool: True if all outputs exist and none is older than a statistics file
+    """
+    files_key = _stats_files_key(stats_dir)
+    if not files_key:
+        return False
+    latest_input = max(mtime_ns for _, mtime_ns, _ in files_key)
+    return all(os.path.exists(output) and os.stat(output).st_mtime_ns > latest_input for output in outputs)
+
+@lru_cache(maxsize=4)
+def _load_summaries(files_key):
+    return compute_summaries(_load_combined_stats(files_key))
+
+def load_summaries(stats_dir='analysis_output'):
+    """
+    Load the statistics in a directory and aggregate them, once per set of files.
+
+    The aggregates are cached like load_combined_stats, so every writer in
+    the same process shares one pair of summary tables.
+
+    Args:
+        stats_dir (str): Directory containing the *_genome_statistics.tsv files
+
+    Returns:
+        tuple: (protein_df, genome_df) as returned by compute_summaries
+    """
+    return _load_summaries(_stats_files_key(stats_dir))
+
+def write_tsv(df, path, index=True):
+    """
+    Write a summary table as TSV, with Arrow's CSV writer when pyarrow is installed.
+
+    Args:
+        df (pd.DataFrame): Table to write
+        path (str): Output file path
+        index (bool): Write the index as an unnamed first column
+    """
+    write_delimited(df, path, sep='\t', index=index)
+
+def write_summary_files(summaries, stats_dir='analysis_output'):
+    """
+    Write genome_performance_summary.tsv and protein_families_summary.tsv.
+
+    Args:
+        summaries (tuple): (protein_df, genome_df) from compute_summaries
+        stats_dir (str): Directory to write the files to
+    """
+    protein_fam_df, genome_perf_df = summaries
+    write_tsv(genome_perf_df, os.path.join(stats_dir, GENOME_SUMMARY_FILE))
+    write_tsv(protein_fam_df, os.path.join(stats_dir, PROTEIN_SUMMARY_FILE), index=False)
+
+    print("Summary files updated!")
+    print(f"Genome performance summary: {len(genome_perf_df)} genomes")
+    print(f"Protein families summary: {len(protein_fam_df)} families")
+
+def write_comprehensive_summary(summaries, stats_dir='analysis_output'):
+    """
+    Write the comprehensive_summary.txt overview of both summary tables.
+
+    Args:
+        summaries (tuple): (protein_df, genome_df) from compute_summaries
+        stats_dir (str): Directory to write the file to
+    """
+    protein_df, genome_df = summaries
+    genomes = list(genome_df.index)
+
+    # Create comprehensive summary
+    summary = io.StringIO()
+    summary.write('\nCOMPREHENSIVE ANALYSIS SUMMARY\n')
+    summary.write('==============================\n\n')
+    summary.write(f'Analysis completed for {len(protein_df)} protein families across {len(genomes)} genomes.\n\n')
+
+    # Protein family overview
+    summary.write('PROTEIN FAMILY OVERVIEW:\n')
+    protein_df.to_string(summary, index=False, float_format='{:.1f}'.format)
+
+    summary.write('\n\nGENOME PERFORMANCE OVERVIEW:\n')
+    genome_df.to_string(summary, float_format='{:.1f}'.format)
+
+    summary.write(f'\n\nFiles saved in: {stats_dir}/')
+
+    # Save to file
+    with open(os.path.join(stats_dir, COMPREHENSIVE_SUMMARY_FILE), 'w') as f:
+        f.write(summary.getvalue())
+
+    print("Comprehensive summary updated!")
+    print(f"Total protein families: {len(protein_df)}")
+    print(f"Total genomes: {len(genomes)}")
+    print(f"Genomes: {', '.join(genomes)}")
+
+def write_all_summaries(stats_dir='analysis_output'):
+    """
+    Write all three summary files from one load and aggregation of the statistics.
+
+    Args:
+        stats_dir (str): Directory containing the *_genome_statistics.tsv files
+    """
+    outputs = [os.path.join(stats_dir, file) for file in
+               (GENOME_SUMMARY_FILE, PROTEIN_SUMMARY_FILE, COMPREHENSIVE_SUMMARY_FILE)]
+    if outputs_up_to_date(outputs, stats_dir):
+        print("Summaries are up to date")
+        return
+    summaries = load_summaries(stats_dir)
+    write_summary_files(summaries, stats_dir)
+    write_comprehensive_summary(summaries, stats_dir)
+
+if __name__ == "__main__":
+    write_all_summaries()
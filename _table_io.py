@@ -0,0 +1,41 @@
+"""
+Delimited text output shared by the search and summary scripts.
+"""
+
+import numpy as np
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional: Arrow's multithreaded CSV writer
+    pa = None
+
+def write_delimited(df, path, sep=',', index=False):
+    """
+    Write a DataFrame as delimited text, with Arrow's CSV writer when pyarrow is installed.
+
+    Both writers produce the same bytes: float and object columns are rendered the
+    way to_csv renders them (100.0, empty for NaN), nothing is quoted, and tables
+    with a value that would need quoting fall back to to_csv.
+
+    Args:
+        df (pd.DataFrame): Table to write
+        path (str): Output file path
+        sep (str): Field delimiter
+        index (bool): Write the index as the first column
+    """
+    if pa is not None:
+        table_df = df.rename_axis(df.index.name or '').reset_index() if index else df
+        table_df = table_df.assign(**{
+            column: np.where(table_df[column].isna(), '', table_df[column].to_numpy().astype(str))
+            for column in table_df.columns
+            if pd.api.types.is_float_dtype(table_df[column]) or table_df[column].dtype == object
+        })
+        try:
+            table = pa.Table.from_pandas(table_df, preserve_index=False)
+            options = pa_csv.WriteOptions(delimiter=sep, quoting_style='none', quoting_header='none')
+            pa_csv.write_csv(table, path, write_options=options)
+            return
+        except pa.ArrowInvalid:
+            pass
+    df.to_csv(path, sep=sep, index=index)
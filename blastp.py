@@ -1,12 +1,30 @@
 from Bio import SeqIO
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from functools import lru_cache
+import glob
+import numpy as np
 import os
+import pandas as pd
+import re
+import shutil
 import subprocess
+import tempfile
+from _table_io import write_delimited
+
+# True if target exists and is at least as new as every source file
+def is_up_to_date(target, sources):
+    if not os.path.exists(target):
+        return False
+    target_mtime = os.path.getmtime(target)
+    return all(os.path.getmtime(source) <= target_mtime for source in sources)
 
 # Create a BLAST database from a FASTA file
 def create_blast_database(db_file, db_name):
     print("Creating BLAST database...")
-    if os.path.exists(db_file+".phr"):
-        print(f"BLAST database already exists: {db_name}")
+    # Large databases are split into volumes (db.00.phr, db.01.phr, ...)
+    db_files = glob.glob(glob.escape(db_name) + '*.phr')
+    if db_files and all(is_up_to_date(f, [db_file]) for f in db_files):
+        print(f"BLAST database is up to date: {db_name}")
         return
     subprocess.run([
         'makeblastdb',
@@ -15,104 +33,380 @@ def create_blast_database(db_file, db_name):
         '-out', db_name
     ], check=True)
 
-def run_command(cmd, check_error=True):
-    """Run a command and return the result"""
+# Read the BLAST database files once so they are in the OS page cache for the search
+# (large databases are split into volumes: db.00.phr, db.01.phr, ...)
+def warm_blast_database(db_name, chunk_size=1 << 20):
+    db_files = sorted(glob.glob(glob.escape(db_name) + '*.p*'))
+    total_bytes = 0
+    for db_file in db_files:
+        with open(db_file, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                total_bytes += len(chunk)
+    print(f"Warmed BLAST database {db_name}: {len(db_files)} files, {total_bytes / 1e6:.1f} MB")
+
+def run_command(cmd, capture=False):
+    """Run a command and return the result; stdout is discarded unless capture is True"""
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        if check_error and result.returncode != 0:
-            print(f"Command failed: {cmd}")
-            print(f"Error: {result.stderr}")
-        return result
+        return subprocess.run(cmd, check=True, stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+                              stderr=subprocess.PIPE, text=capture)
+    except subprocess.CalledProcessError as e:
+        stderr = e.stderr.decode(errors='replace') if isinstance(e.stderr, bytes) else e.stderr
+        print(f"Command failed: {cmd}")
+        print(f"Error: {stderr}")
+        return None
     except Exception as e:
         print(f"Error running command: {e}")
         return None
 
-# Run a BLASTP search
-def run_blastp(query_file, db_name, blast_output_file, evalue = 1e-5, max_target_seqs = 10, n_cores = 1):
-    print("Running BLASTP search...")
+# Default number of BLAST threads: BLAST_NUM_THREADS if set, otherwise all cores
+def default_num_threads():
+    env_threads = os.environ.get('BLAST_NUM_THREADS')
+    if env_threads:
+        return int(env_threads)
+    return os.cpu_count() or 1
+
+# Search parameters, recorded next to a search output (output_file + '.params') so that
+# changed settings re-run the search, e.g. "blastp evalue=1e-05 max_target_seqs=10 mt_mode=1"
+def search_params(tool, **params):
+    return ' '.join([tool] + [f"{name}={value}" for name, value in params.items()]) + '\n'
+
+def write_search_params(output_file, params):
+    with open(output_file + '.params', 'w') as f:
+        f.write(params)
+
+# True if output_file is newer than every source and was written with the same parameters
+def search_output_up_to_date(output_file, sources, params):
+    if not is_up_to_date(output_file, sources):
+        return False
+    try:
+        with open(output_file + '.params') as f:
+            return f.read() == params
+    except OSError:
+        return False
+
+# Run a command that writes output_file (build_cmd maps an output path to the command line).
+# The command writes to a temporary file that is renamed into place only on success, so a
+# failed or killed search never leaves a partial output that later looks up to date; the
+# parameters are recorded after the rename
+def run_command_to_file(build_cmd, output_file, params):
+    fd, tmp_file = tempfile.mkstemp(prefix=os.path.basename(output_file) + '.', suffix='.tmp',
+                                    dir=os.path.dirname(output_file) or '.')
+    os.close(fd)
+    try:
+        result = run_command(build_cmd(tmp_file), capture=False)
+        if result is not None:
+            os.replace(tmp_file, output_file)
+            write_search_params(output_file, params)
+        return result
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+# Installed BLASTP version as a tuple, e.g. (2, 15, 0); None if it cannot be determined
+@lru_cache(maxsize=None)
+def blastp_version():
+    result = run_command(['blastp', '-version'], capture=True)
+    match = re.search(r'blastp: (\d+)\.(\d+)\.(\d+)', result.stdout) if result else None
+    return tuple(int(x) for x in match.groups()) if match else None
+
+# Parameters of a BLASTP search (see search_params)
+def blastp_params(evalue, max_target_seqs, mt_mode):
+    return search_params('blastp', evalue=evalue, max_target_seqs=max_target_seqs, mt_mode=mt_mode)
+
+# True if the BLAST output is newer than the query file and every database volume,
+# and was written with the same parameters
+def blast_results_up_to_date(blast_output_file, query_file, db_name, params):
+    db_files = glob.glob(glob.escape(db_name) + '*.phr')
+    return bool(db_files) and search_output_up_to_date(blast_output_file, [query_file] + db_files, params)
+
+# BLASTP command line for a search (mt_mode None keeps BLAST's default threading mode)
+def blastp_command(query_file, db_name, blast_output_file, evalue, max_target_seqs, n_cores, mt_mode):
     blastp_cmd = [
         'blastp',
         '-query', query_file,
         '-db', db_name,
-        '-out', blast_output_file,
         '-evalue', str(evalue),
         '-max_target_seqs', str(max_target_seqs),
         '-num_threads', str(n_cores),
         '-outfmt', '6 qseqid sseqid pident length mismatch gapopen qstart qend sstart send evalue bitscore qlen slen qcovs',
+        '-out', blast_output_file,
     ]
+    if mt_mode is not None:
+        blastp_cmd += ['-mt_mode', str(mt_mode)]
+    return blastp_cmd
+
+# Run a BLASTP search
+# mt_mode 1 threads by query rather than by database, which suits many short
+# queries against a single genome's proteome
+def run_blastp(query_file, db_name, blast_output_file, evalue = 1e-5, max_target_seqs = 10, n_cores = None, mt_mode = 1):
+    print("Running BLASTP search...")
+    params = blastp_params(evalue, max_target_seqs, mt_mode)
+    if blast_results_up_to_date(blast_output_file, query_file, db_name, params):
+        print(f"BLAST results are up to date, skipping search: {blast_output_file}")
+        return subprocess.CompletedProcess(['blastp'], 0)
+    if n_cores is None:
+        n_cores = default_num_threads()
+    if mt_mode is not None and (blastp_version() or (0,)) < (2, 12, 0):
+        print("    -mt_mode requires BLAST 2.12+, using the default threading mode")
+        mt_mode = None
+    print(f"    Threads: {n_cores}, MT mode: {mt_mode if mt_mode is not None else 'default'}")
+    warm_blast_database(db_name)
     try:
-        result = run_command(blastp_cmd)
+        result = run_command_to_file(
+            lambda out: blastp_command(query_file, db_name, out, evalue, max_target_seqs, n_cores, mt_mode),
+            blast_output_file, params)
     except Exception as e:
         print(f"Error running BLASTP: {e}")
         return None
+    if result is None:
+        return None
+    print(f"BLAST results saved to: {blast_output_file}")
+    return result
+
+# Create a DIAMOND database from a FASTA file
+def create_diamond_database(db_file, db_name):
+    print("Creating DIAMOND database...")
+    if is_up_to_date(db_name + ".dmnd", [db_file]):
+        print(f"DIAMOND database is up to date: {db_name}")
+        return
+    subprocess.run([
+        'diamond', 'makedb',
+        '--in', db_file,
+        '-d', db_name
+    ], check=True)
+
+# Run a DIAMOND blastp search (same tabular columns as run_blastp)
+def run_diamond(query_file, db_name, blast_output_file, evalue = 1e-5, max_target_seqs = 10, n_cores = None, sensitivity = 'sensitive'):
+    print("Running DIAMOND search...")
+    if n_cores is None:
+        n_cores = default_num_threads()
+    print(f"    Threads: {n_cores}, Sensitivity: {sensitivity}")
+    params = search_params('diamond', evalue=evalue, max_target_seqs=max_target_seqs, sensitivity=sensitivity)
+    if search_output_up_to_date(blast_output_file, [query_file, db_name + '.dmnd'], params):
+        print(f"DIAMOND results are up to date, skipping search: {blast_output_file}")
+        return subprocess.CompletedProcess(['diamond'], 0)
+    diamond_cmd = [
+        'diamond', 'blastp',
+        '-q', query_file,
+        '-d', db_name,
+        '--evalue', str(evalue),
+        '--max-target-seqs', str(max_target_seqs),
+        '-p', str(n_cores),
+        '-f', '6', 'qseqid', 'sseqid', 'pident', 'length', 'mismatch', 'gapopen', 'qstart', 'qend',
+        'sstart', 'send', 'evalue', 'bitscore', 'qlen', 'slen', 'qcovhsp',
+    ]
+    if sensitivity:
+        diamond_cmd.append(f'--{sensitivity}')
+    try:
+        result = run_command_to_file(lambda out: diamond_cmd + ['-o', out], blast_output_file, params)
+    except Exception as e:
+        print(f"Error running DIAMOND: {e}")
+        return None
+    if result is None:
+        return None
+    print(f"DIAMOND results saved to: {blast_output_file}")
+    return result
+
+# Split the query FASTA into chunks and run one single-threaded BLASTP per chunk
+def run_blastp_parallel(query_file, db_name, blast_output_file, evalue = 1e-5, max_target_seqs = 10, n_workers = None):
+    params = search_params('blastp', evalue=evalue, max_target_seqs=max_target_seqs, split_queries=True)
+    if blast_results_up_to_date(blast_output_file, query_file, db_name, params):
+        print(f"BLAST results are up to date, skipping search: {blast_output_file}")
+        return []
+    if n_workers is None:
+        n_workers = default_num_threads()
+    records = list(SeqIO.parse(query_file, "fasta"))
+    n_workers = max(1, min(n_workers, len(records)))
+    print(f"Running BLASTP search in {n_workers} parallel workers...")
+    warm_blast_database(db_name)
+
+    tmp_dir = tempfile.mkdtemp(prefix="blastp_parallel_", dir=os.path.dirname(blast_output_file) or ".")
+    try:
+        # Round-robin the records so the chunks have roughly equal sizes
+        chunk_files = []
+        for i in range(n_workers):
+            chunk_file = os.path.join(tmp_dir, f"chunk_{i}.fasta")
+            SeqIO.write(records[i::n_workers], chunk_file, "fasta")
+            chunk_files.append(chunk_file)
+        chunk_outputs = [f + ".tsv" for f in chunk_files]
+
+        # Start all chunks, then wait for them; if the wait is interrupted (e.g. by the
+        # search timeout), the running BLAST processes are killed instead of waited for
+        commands = [blastp_command(chunk_file, db_name, chunk_output, evalue, max_target_seqs, 1, None)
+                    for chunk_file, chunk_output in zip(chunk_files, chunk_outputs)]
+        processes = []
+        try:
+            for cmd in commands:
+                processes.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE))
+            results = []
+            for cmd, process in zip(commands, processes):
+                _, stderr = process.communicate()
+                results.append(subprocess.CompletedProcess(cmd, process.returncode, stderr=stderr))
+        except BaseException:
+            for process in processes:
+                process.kill()
+                process.wait()
+            raise
+        failed = [result for result in results if result.returncode != 0]
+        for result in failed:
+            print(f"Command failed: {result.args}")
+            print(f"Error: {result.stderr.decode(errors='replace')}")
+        if failed:
+            print("BLASTP failed for at least one chunk")
+            return None
+
+        # Concatenate the per-chunk outputs, then move the complete file into place
+        merged_output = os.path.join(tmp_dir, "merged.tsv")
+        with open(merged_output, 'w') as out:
+            for chunk_output in chunk_outputs:
+                with open(chunk_output, 'r') as f:
+                    shutil.copyfileobj(f, out)
+        os.replace(merged_output, blast_output_file)
+        write_search_params(blast_output_file, params)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
     print(f"BLAST results saved to: {blast_output_file}")
+    return results
+
+# Run a single BLASTP search for several query files and split the hits per file
+# (query ids shared by several files must have the same sequence)
+def run_blastp_batch(query_files, db_name, blast_output_files, evalue = 1e-5, max_target_seqs = 10, n_cores = None, mt_mode = 1):
+    print(f"Running batched BLASTP search for {len(query_files)} query files...")
+    if len(query_files) != len(blast_output_files):
+        raise ValueError("query_files and blast_output_files must have the same length")
+
+    # Merge the query files, remembering which files each query id came from
+    query_sources = {}
+    merged_records = {}
+    for i, query_file in enumerate(query_files):
+        for record in SeqIO.parse(query_file, "fasta"):
+            if record.id not in merged_records:
+                merged_records[record.id] = record
+                query_sources[record.id] = []
+            elif merged_records[record.id].seq != record.seq:
+                raise ValueError(f"Query {record.id} has different sequences in the batched query files")
+            query_sources[record.id].append(i)
+
+    tmp_dir = tempfile.mkdtemp(prefix="blastp_batch_", dir=os.path.dirname(db_name) or ".")
+    try:
+        merged_query_file = os.path.join(tmp_dir, "queries.fasta")
+        merged_output_file = os.path.join(tmp_dir, "merged.tsv")
+        SeqIO.write(merged_records.values(), merged_query_file, "fasta")
+        result = run_blastp(merged_query_file, db_name, merged_output_file,
+            evalue=evalue, max_target_seqs=max_target_seqs, n_cores=n_cores, mt_mode=mt_mode)
+        if result is None:
+            return None
+
+        # Route each hit back to the output file(s) of its query file, then move them into place
+        split_outputs = [os.path.join(tmp_dir, f"split_{i}.tsv") for i in range(len(blast_output_files))]
+        out_handles = [open(f, 'w') for f in split_outputs]
+        try:
+            with open(merged_output_file, 'r') as f:
+                for line in f:
+                    query_id = line.split('\t', 1)[0]
+                    for i in query_sources.get(query_id, []):
+                        out_handles[i].write(line)
+        finally:
+            for handle in out_handles:
+                handle.close()
+        params = blastp_params(evalue, max_target_seqs, mt_mode)
+        for split_output, blast_output_file in zip(split_outputs, blast_output_files):
+            os.replace(split_output, blast_output_file)
+            write_search_params(blast_output_file, params)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    for blast_output_file in blast_output_files:
+        print(f"BLAST results saved to: {blast_output_file}")
     return result
 
-# Parse BLAST results
-def parse_blast_results(blast_output_file):
+# Columns of the tabular (-outfmt 6) BLAST output and their types
+BLAST_COLUMNS = ['query_id', 'subject_id', 'pident', 'length', 'mismatch', 'gapopen', 'qstart', 'qend',
+                 'sstart', 'send', 'evalue', 'bitscore', 'qlen', 'slen', 'qcovs']
+BLAST_DTYPES = {
+    'query_id': str, 'subject_id': str, 'pident': float, 'length': int, 'mismatch': int, 'gapopen': int,
+    'qstart': int, 'qend': int, 'sstart': int, 'send': int, 'evalue': float, 'bitscore': float,
+    'qlen': int, 'slen': int, 'qcovs': float
+}
+
+# Columns of the best hits table (one row per query)
+BEST_HIT_COLUMNS = BLAST_COLUMNS + ['significance']
+BEST_HIT_INT_COLUMNS = ['length', 'mismatch', 'gapopen', 'qstart', 'qend', 'sstart', 'send', 'qlen', 'slen']
+
+# Significance classes as (min pident, min qcovs, max evalue), checked in order
+SIGNIFICANCE_LABELS = ["VERY HIGH (likely ortholog)", "HIGH (likely ortholog)", "MEDIUM (likely homolog)"]
+HIT_THRESHOLDS = [(70, 80, 1e-50), (50, 70, 1e-20), (30, 50, 1e-5)]
+BEST_HIT_THRESHOLDS = [(70, 80, 1e-50), (50, 60, 1e-20), (30, 40, 1e-5)]
+
+# Classify a DataFrame of hits into significance classes
+def classify_significance(hits, thresholds=HIT_THRESHOLDS):
+    conditions = [
+        (hits['pident'] >= pident) & (hits['qcovs'] >= qcovs) & (hits['evalue'] <= evalue)
+        for pident, qcovs, evalue in thresholds
+    ]
+    return np.select(conditions, SIGNIFICANCE_LABELS, default="LOW (possible homolog)")
+
+# Best hit for each query: the first hit in BLAST's own ranking (output order)
+def select_best_hits(blast_results):
+    return blast_results.drop_duplicates('query_id')
+
+# Parse BLAST results, optionally dropping hits above an E-value cutoff
+def parse_blast_results(blast_output_file, evalue_cutoff=None):
     print("Parsing BLAST results...")
-    blast_results = []
-    with open(blast_output_file, 'r') as f:
-        for line in f:
-            if line.startswith('#'):
-                continue
-            if not line.strip():
-                continue
-            fields = line.strip().split('\t')
-            if len(fields) < 14:
-                continue
-            blast_results.append({
-                'query_id': fields[0],
-                'subject_id': fields[1],
-                'pident': float(fields[2]),
-                'length': int(fields[3]),
-                'mismatch': int(fields[4]),
-                'gapopen': int(fields[5]),
-                'qstart': int(fields[6]),
-                'qend': int(fields[7]),
-                'sstart': int(fields[8]),
-                'send': int(fields[9]),
-                'evalue': float(fields[10]),
-                'bitscore': float(fields[11]),
-                'qlen': int(fields[12]),
-                'slen': int(fields[13]),
-                'qcovs': float(fields[14]) if len(fields) > 14 else 0
-                }
-            )
+    if os.path.getsize(blast_output_file) == 0:
+        blast_results = pd.DataFrame(columns=BLAST_COLUMNS)
+    else:
+        blast_results = pd.read_csv(blast_output_file, sep='\t', comment='#', header=None,
+                                    names=BLAST_COLUMNS, dtype={'query_id': str, 'subject_id': str},
+                                    float_precision='round_trip')
+        # Skip truncated lines; older outputs may lack the qcovs column
+        blast_results = blast_results.dropna(subset=BLAST_COLUMNS[:14])
+        blast_results['qcovs'] = blast_results['qcovs'].fillna(0)
+        blast_results = blast_results.astype(BLAST_DTYPES)
+        if evalue_cutoff is not None:
+            blast_results = blast_results[blast_results['evalue'] <= float(evalue_cutoff)]
+        blast_results = blast_results.reset_index(drop=True)
+    blast_results['significance'] = classify_significance(blast_results)
     print(f"Found {len(blast_results)} BLAST hits")
     # Show summary of results
-    if blast_results:
+    if not blast_results.empty:
         print("\nTop BLAST hits summary:")
-        for i, hit in enumerate(blast_results[:10]):
-            print(f"{i+1:2d}. Query: {hit['query_id']} -> Subject: {hit['subject_id']}")
-            print(f"    Identity: {hit['pident']:.1f}%, E-value: {hit['evalue']:.2e}, Coverage: {hit['qcovs']:.1f}%")
+        for i, hit in enumerate(blast_results.head(10).itertuples(index=False)):
+            print(f"{i+1:2d}. Query: {hit.query_id} -> Subject: {hit.subject_id}")
+            print(f"    Identity: {hit.pident:.1f}%, E-value: {hit.evalue:.2e}, Coverage: {hit.qcovs:.1f}%")
     
     else:
         print("BLAST search failed")        
     return blast_results
         
-# Analyze BLAST results
+# Read query proteins as light-weight (id, sequence, description) tuples
+def read_query_proteins(query_file):
+    with open(query_file, 'r') as f:
+        return [(title.split(None, 1)[0] if title else '', seq, title) for title, seq in SimpleFastaParser(f)]
+
+# Analyze BLAST results (query_proteins as returned by read_query_proteins)
 def analyze_blast_results(blast_results, query_proteins):
     print("Analyzing BLAST results...")
-    results_by_query = {}
-    for hit in blast_results:
-        query_id = hit['query_id']
-        if query_id not in results_by_query:
-            results_by_query[query_id] = []
-        results_by_query[query_id].append(hit)
+    proteins_by_id = {p[0]: p for p in query_proteins}
+    # Best hits use looser coverage thresholds
+    best_frame = select_best_hits(blast_results)
+    best_frame = best_frame.assign(significance=classify_significance(best_frame, BEST_HIT_THRESHOLDS))
+    best_by_query = dict(zip(best_frame['query_id'], best_frame.to_dict('records')))
+    results_by_query = {
+        query_id: hits.to_dict('records')
+        for query_id, hits in blast_results.groupby('query_id', sort=False)
+    }
 
     # Analyze results by query
     for query_id, hits in results_by_query.items():
         print(f"Query: {query_id}")
-        query_seq = None
-        for seq in query_proteins:  # query_proteins is now a list, no need for iter()
-            if seq.id == query_id:
-                query_seq = seq
-                print(f"    Sequence: {seq.seq}")
-                break
+        query_seq = proteins_by_id.get(query_id)
         if query_seq:
-            print(f"Query length: {len(query_seq.seq)} amino acids")
-            print(f"Query description: {query_seq.description}")
+            print(f"    Sequence: {query_seq[1]}")
+            print(f"Query length: {len(query_seq[1])} amino acids")
+            print(f"Query description: {query_seq[2]}")
         print(f"Number of significant hits (E-value < 1e-5): {len(hits)}")
 
          # Analyze hits
@@ -126,65 +420,42 @@ def analyze_blast_results(blast_results, query_proteins):
             print(f"    Alignment length: {hit['length']} aa")
             print(f"    Subject length: {hit['slen']} aa")
             
-            # Determine significance
-            if hit['pident'] >= 70 and hit['qcovs'] >= 80 and hit['evalue'] <= 1e-50:
-                significance = "VERY HIGH (likely ortholog)"
-            elif hit['pident'] >= 50 and hit['qcovs'] >= 70 and hit['evalue'] <= 1e-20:
-                significance = "HIGH (likely ortholog)"
-            elif hit['pident'] >= 30 and hit['qcovs'] >= 50 and hit['evalue'] <= 1e-5:
-                significance = "MEDIUM (likely homolog)"
-            else:
-                significance = "LOW (possible homolog)"
-            
+            significance = hit['significance']
             print(f"    Significance: {significance}")
         print("\n" + "="*60 + "\n")
     # Get the best hits for further analysis
     print("=== EXTRACTING SEQUENCES OF BEST HITS ===")
-    best_hits = {}
-    for query in query_proteins:  # query_proteins is now a list, no need for iter()
-        query_id = query.id
+    for query_id in proteins_by_id:
         print(f"Processing query: {query_id}")
-        if query_id in results_by_query:
-            hits = results_by_query[query_id]
-            best_hits[query_id] = hits[0]
-            print(f"Best hit for {query_id}: {best_hits[query_id]['subject_id']}")
-            print(f"    Identity: {best_hits[query_id]['pident']:.1f}%")
-            print(f"    E-value: {best_hits[query_id]['evalue']:.2e}")
-            print(f"    Bit score: {best_hits[query_id]['bitscore']:.1f}")
-            print(f"    Query coverage: {best_hits[query_id]['qcovs']:.1f}%")
-            print(f"    Alignment length: {best_hits[query_id]['length']} aa")
-            print(f"    Subject length: {best_hits[query_id]['slen']} aa")
-            best_hit = best_hits[query_id]
-            if best_hit['pident'] >= 70 and best_hit['qcovs'] >= 80 and best_hit['evalue'] <= 1e-50:
-                best_hits[query_id]['significance'] = "VERY HIGH (likely ortholog)"
-            elif best_hit['pident'] >= 50 and best_hit['qcovs'] >= 60 and best_hit['evalue'] <= 1e-20:
-                best_hits[query_id]['significance'] = "HIGH (likely ortholog)"
-            elif best_hit['pident'] >= 30 and best_hit['qcovs'] >= 40 and best_hit['evalue'] <= 1e-5:
-                best_hits[query_id]['significance'] = "MEDIUM (likely homolog)"
-            else:
-                best_hits[query_id]['significance'] = "LOW (possible homolog)"
-            print(f"    Significance: {best_hits[query_id]['significance']}")
+        if query_id in best_by_query:
+            best_hit = best_by_query[query_id]
+            print(f"Best hit for {query_id}: {best_hit['subject_id']}")
+            print(f"    Identity: {best_hit['pident']:.1f}%")
+            print(f"    E-value: {best_hit['evalue']:.2e}")
+            print(f"    Bit score: {best_hit['bitscore']:.1f}")
+            print(f"    Query coverage: {best_hit['qcovs']:.1f}%")
+            print(f"    Alignment length: {best_hit['length']} aa")
+            print(f"    Subject length: {best_hit['slen']} aa")
+            print(f"    Significance: {best_hit['significance']}")
         else:
-            # Set fields to None
-            best_hits[query_id] = {
-                'query_id': query.id,
-                'subject_id': None,
-                'pident': None,
-                'evalue': None,
-                'bitscore': None,
-                'qcovs': None,
-                'length': None,
-                'mismatch': None,
-                'gapopen': None,
-                'qstart': None,
-                'qend': None,
-                'sstart': None,
-                'send': None,
-                'qlen': len(query.seq),
-                'slen': None,
-                'qcovs': 0,
-                'significance': "NOT FOUND"
-            }
             print(f"No hits found for {query_id}")
         print("\n" + "="*60 + "\n")
-    return best_hits
\ No newline at end of file
+    # One row per query in FASTA order; queries without hits keep their own length
+    queries = pd.DataFrame({
+        'query_id': list(proteins_by_id),
+        'query_len': [len(query[1]) for query in proteins_by_id.values()]
+    })
+    best_hits_df = queries.merge(best_frame, on='query_id', how='left', sort=False)
+    best_hits_df = best_hits_df.fillna({
+        'qlen': best_hits_df['query_len'], 'significance': "NOT FOUND"
+    })[BEST_HIT_COLUMNS]
+    # Queries without hits report an integer 0 coverage (written as 0, not 0.0)
+    best_hits_df['qcovs'] = best_hits_df['qcovs'].astype(object).where(best_hits_df['subject_id'].notna(), 0)
+    # Nullable integers keep integer formatting for queries without hits
+    return best_hits_df.astype({column: 'Int64' for column in BEST_HIT_INT_COLUMNS})
+
+# Write the best hits table (comma separated, as read back by parse_best_hits.py),
+# with Arrow's CSV writer when pyarrow is installed
+def write_best_hits(best_hits, output_file):
+    write_delimited(best_hits, output_file)
+    print(f"Best hits saved to: {output_file}")
\ No newline at end of file
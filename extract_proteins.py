@@ -1,138 +1,154 @@
 print("Step 1: Extracting protein sequences from genomes")
 print("=" * 50)
 
+import csv
 import re
+import pandas as pd
 from Bio.SeqUtils import gc_fraction
 from collections import defaultdict
 from Bio import SeqIO
+from Bio.Data.CodonTable import standard_dna_table
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 
 output_dir = "proteins"
 
+GFF3_COLUMNS = ['scaffold', 'source', 'type', 'start', 'end', 'score', 'strand', 'phase', 'attributes']
+
+# Standard genetic code for uppercase DNA codons, including stops
+CODON_TABLE = {codon.encode(): aa for codon, aa in standard_dna_table.forward_table.items()}
+CODON_TABLE.update({codon.encode(): '*' for codon in standard_dna_table.stop_codons})
+
+DNA_COMPLEMENT = bytes.maketrans(b'ACGTURYSWKMBDHVNacgturyswkmbdhvn', b'TGCAAYRSWMKVHDBNtgcaayrswmkvhdbn')
+
+def reverse_complement(dna):
+    """Reverse complement a DNA bytes sequence"""
+    return dna.translate(DNA_COMPLEMENT)[::-1]
+
+def translate_cds(dna):
+    """Translate a DNA bytes sequence with the standard codon table (trailing partial codon dropped)"""
+    dna = dna.upper()
+    protein = []
+    for i in range(0, len(dna) - 2, 3):
+        codon = dna[i:i + 3]
+        aa = CODON_TABLE.get(codon)
+        if aa is None:
+            # Ambiguous codon: let Biopython resolve it once and remember the answer
+            aa = CODON_TABLE[codon] = str(Seq(codon.decode()).translate())
+        protein.append(aa)
+    return ''.join(protein)
+
+def extract_gff3_attribute(attributes, key):
+    """Extract one key from a Series of GFF3 attribute strings (NaN where absent)"""
+    return attributes.str.extract(rf'(?:^|;){re.escape(key)}=([^;]*)', expand=False)
+
 def parse_gff3_and_extract_proteins(gff_path, genome_path, genome_name):
     """Extract protein sequences from genome using GFF3 annotations"""
     
-    # Load genome sequences
-    print(f"Loading {genome_name} genome sequences...")
-    genome_seqs = {}
-    for record in SeqIO.parse(genome_path, "fasta"):
-        genome_seqs[record.id] = record.seq
-    print(f"Loaded {len(genome_seqs)} scaffolds")
+    # Index genome sequences; scaffolds are only read when they are needed
+    print(f"Indexing {genome_name} genome sequences...")
+    genome_index = SeqIO.index(genome_path, "fasta")
+    print(f"Indexed {len(genome_index)} scaffolds")
     
     # Parse GFF3 to extract CDS features
     print(f"Parsing {genome_name} GFF3 annotations...")
     cds_features = defaultdict(list)
     gene_info = {}
     
-    with open(gff_path, 'r') as f:
-        for line in f:
-            if line.startswith('#') or not line.strip():
-                continue
-                
-            parts = line.strip().split('\t')
-            if len(parts) < 9:
-                continue
-                
-            scaffold, source, feature_type, start, end, score, strand, phase, attributes = parts
-            
-            if feature_type == 'CDS':
-                # Parse attributes
-                attr_dict = {}
-                for attr in attributes.split(';'):
-                    if '=' in attr:
-                        key, value = attr.split('=', 1)
-                        attr_dict[key] = value
-                
-                # Extract protein ID
-                protein_id = None
-                if 'Parent' in attr_dict:
-                    parent_id = attr_dict['Parent']
-                    if parent_id.startswith('mRNA_'):
-                        protein_id = parent_id
-                
-                if protein_id:
-                    cds_features[protein_id].append({
-                        'scaffold': scaffold,
-                        'start': int(start),
-                        'end': int(end),
-                        'strand': strand,
-                        'phase': int(phase) if phase.isdigit() else 0
-                    })
-                if 'product' in attr_dict:
-                    gene_info[protein_id]['product'] = attr_dict['product']
-
-            elif feature_type == 'mRNA':
-                # Store gene information
-                attr_dict = {}
-                for attr in attributes.split(';'):
-                    if '=' in attr:
-                        key, value = attr.split('=', 1)
-                        attr_dict[key] = value
-                
-                if 'ID' in attr_dict:
-                    gene_info[attr_dict['ID']] = {
-                        'name': attr_dict.get('Name', ''),
-                        'proteinId': attr_dict.get('proteinId', ''),
-                        'product': attr_dict.get('product', '')
-                    }
+    gff = pd.read_csv(gff_path, sep='\t', header=None, names=GFF3_COLUMNS, dtype=str,
+                      quoting=csv.QUOTE_NONE, keep_default_na=False)
+    gff = gff[~gff['scaffold'].str.startswith('#') & gff['attributes'].notna()]
+    
+    # Store gene information
+    mrna = gff[gff['type'] == 'mRNA']
+    mrna_ids = extract_gff3_attribute(mrna['attributes'], 'ID')
+    mrna_info = pd.DataFrame({
+        'name': extract_gff3_attribute(mrna['attributes'], 'Name'),
+        'proteinId': extract_gff3_attribute(mrna['attributes'], 'proteinId'),
+        'product': extract_gff3_attribute(mrna['attributes'], 'product'),
+    }).fillna('')
+    for gene_id, info in zip(mrna_ids, mrna_info.to_dict('records')):
+        if isinstance(gene_id, str):
+            gene_info[gene_id] = info
+    
+    # Group CDS features by their parent mRNA
+    cds = gff[gff['type'] == 'CDS']
+    cds = cds.assign(
+        protein_id=extract_gff3_attribute(cds['attributes'], 'Parent'),
+        product=extract_gff3_attribute(cds['attributes'], 'product'),
+        start=cds['start'].astype(int),
+        end=cds['end'].astype(int),
+        phase=pd.to_numeric(cds['phase'].where(cds['phase'].str.isdigit(), '0')).astype(int),
+    )
+    cds = cds[cds['protein_id'].str.startswith('mRNA_', na=False)]
+    cds_records = cds[['scaffold', 'start', 'end', 'strand', 'phase']].to_dict('records')
+    for protein_id, record in zip(cds['protein_id'], cds_records):
+        cds_features[protein_id].append(record)
+    # CDS-level product annotations; the mRNA row may be missing, so create the entry
+    cds_products = cds.dropna(subset=['product']).drop_duplicates('protein_id', keep='last')
+    for protein_id, product in zip(cds_products['protein_id'], cds_products['product']):
+        gene_info.setdefault(protein_id, {})['product'] = product
     
     print(f"Found {len(cds_features)} genes with CDS features")
     
-    # Extract and translate CDS sequences
-    proteins = []
+    # Group genes by scaffold so only one scaffold is held in memory at a time
+    genes_by_scaffold = defaultdict(list)
     for protein_id, cds_list in cds_features.items():
         if not cds_list:
             continue
             
         # Sort CDS by start position
         cds_list.sort(key=lambda x: x['start'])
-        
+        genes_by_scaffold[cds_list[0]['scaffold']].append(protein_id)
+    
+    # Extract and translate CDS sequences
+    proteins_by_id = {}
+    for scaffold_id, protein_ids in genes_by_scaffold.items():
         # Get scaffold sequence
-        scaffold_id = cds_list[0]['scaffold']
-        if scaffold_id not in genome_seqs:
+        if scaffold_id not in genome_index:
             continue
             
-        scaffold_seq = genome_seqs[scaffold_id]
-        
-        # Extract and concatenate CDS sequences
-        cds_seq = ""
-        for cds in cds_list:
-            start = cds['start'] - 1  # Convert to 0-based
-            end = cds['end']
-            cds_part = scaffold_seq[start:end]
-            cds_seq += str(cds_part)
+        scaffold_seq = bytes(genome_index[scaffold_id].seq)
         
-        # Reverse complement if on negative strand
-        if cds_list[0]['strand'] == '-':
-            cds_seq = str(Seq(cds_seq).reverse_complement())
-        
-        # Translate to protein
-        try:
-            protein_seq = str(Seq(cds_seq).translate())
-            # Remove stop codon if present at the end
-            if protein_seq.endswith('*'):
-                protein_seq = protein_seq[:-1]
-            
-            # Create protein record
-            gene_name = gene_info.get(protein_id, {}).get('name', protein_id)
-            protein_id_clean = gene_info.get(protein_id, {}).get('proteinId', protein_id)
-            product = gene_info.get(protein_id, {}).get('product', '')
+        for protein_id in protein_ids:
+            cds_list = cds_features[protein_id]
             
-            description = f"{protein_id_clean} {gene_name}"
-            if product:
-                description += f" | {product}"
+            # Extract and concatenate CDS sequences (start converted to 0-based)
+            cds_seq = b"".join(scaffold_seq[cds['start'] - 1:cds['end']] for cds in cds_list)
             
-            protein_record = SeqRecord(
-                Seq(protein_seq),
-                id=protein_id_clean,
-                description=description
-            )
-            proteins.append(protein_record)
+            # Reverse complement if on negative strand
+            if cds_list[0]['strand'] == '-':
+                cds_seq = reverse_complement(cds_seq)
             
-        except Exception as e:
-            # Skip problematic sequences
-            continue
+            # Translate to protein
+            try:
+                protein_seq = translate_cds(cds_seq)
+                # Remove stop codon if present at the end
+                if protein_seq.endswith('*'):
+                    protein_seq = protein_seq[:-1]
+                
+                # Create protein record
+                gene_name = gene_info.get(protein_id, {}).get('name', protein_id)
+                protein_id_clean = gene_info.get(protein_id, {}).get('proteinId', protein_id)
+                product = gene_info.get(protein_id, {}).get('product', '')
+                
+                description = f"{protein_id_clean} {gene_name}"
+                if product:
+                    description += f" | {product}"
+                
+                proteins_by_id[protein_id] = SeqRecord(
+                    Seq(protein_seq),
+                    id=protein_id_clean,
+                    description=description
+                )
+                
+            except Exception as e:
+                # Skip problematic sequences
+                continue
+    genome_index.close()
+    
+    # Return proteins in GFF3 order
+    proteins = [proteins_by_id[protein_id] for protein_id in cds_features if protein_id in proteins_by_id]
     
     print(f"Successfully extracted {len(proteins)} protein sequences")
     return proteins
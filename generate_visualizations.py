@@ -5,39 +5,29 @@ Generate bubble plots and heatmaps for protein best hits analysis.
 
 import os
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')  # headless and safe to use from worker processes
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 from pathlib import Path
-import glob
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+from parse_best_hits import find_best_hits_files
 
-def find_best_hits_files(protein_name, output_dir="output"):
-    """
-    Find all best hits files for a specific protein across all genomes.
-    
-    Args:
-        protein_name (str): Name of the protein file (e.g., 'elongases.fasta')
-        output_dir (str): Output directory path
-        
-    Returns:
-        dict: Dictionary mapping genome names to best hits file paths
-    """
-    best_hits_files = {}
-    
-    # Get all genome directories
-    genome_dirs = [d for d in os.listdir(output_dir) 
-                   if os.path.isdir(os.path.join(output_dir, d))]
-    
-    for genome in genome_dirs:
-        # Look for best hits file for this protein
-        pattern = f"{genome}_best_hits_{protein_name}"
-        files = glob.glob(os.path.join(output_dir, genome, f"{pattern}.tsv"))
-        
-        if files:
-            best_hits_files[genome] = files[0]
-    
-    return best_hits_files
+# Bubble style per significance class; unknown classes are drawn as NOT FOUND
+SIGNIFICANCE_ORDER = [
+    'VERY HIGH (likely ortholog)',
+    'HIGH (likely ortholog)',
+    'MEDIUM (likely homolog)',
+    'LOW (possible homolog)',
+    'NOT FOUND'
+]
+SIGNIFICANCE_SIZES = np.array([200, 150, 100, 50, 10])
+SIGNIFICANCE_COLORS = np.array(['red', 'orange', 'yellow', 'green', 'gray'])
+SIGNIFICANCE_ALPHAS = np.array([0.8, 0.8, 0.8, 0.8, 0.4])
+NOT_FOUND_CODE = SIGNIFICANCE_ORDER.index('NOT FOUND')
 
 def load_best_hits_data(protein_name, output_dir="output"):
     """
@@ -56,15 +46,17 @@ def load_best_hits_data(protein_name, output_dir="output"):
         print(f"No best hits files found for {protein_name}")
         return pd.DataFrame()
     
-    all_data = []
-    
-    for genome, file_path in best_hits_files.items():
+    def load_file(item):
+        genome, file_path = item
         try:
-            df = pd.read_csv(file_path)
-            df['genome'] = genome
-            all_data.append(df)
+            return pd.read_csv(file_path).assign(genome=genome)
         except Exception as e:
             print(f"Error loading {file_path}: {e}")
+            return None
+    
+    # Read the per-genome files concurrently (I/O bound)
+    with ThreadPoolExecutor(max_workers=min(8, len(best_hits_files))) as executor:
+        all_data = [df for df in executor.map(load_file, best_hits_files.items()) if df is not None]
     
     if all_data:
         combined_df = pd.concat(all_data, ignore_index=True)
@@ -72,6 +64,35 @@ def load_best_hits_data(protein_name, output_dir="output"):
     else:
         return pd.DataFrame()
 
+def select_best_hits(data):
+    """
+    Select the best hit (highest identity) for each query-genome combination.
+    
+    Args:
+        data (pd.DataFrame): Combined best hits data
+        
+    Returns:
+        pd.DataFrame: One row per query-genome combination with a percent identity
+    """
+    return (data.dropna(subset=['pident'])
+                .sort_values('pident', ascending=False, kind='stable')
+                .drop_duplicates(['query_id', 'genome']))
+
+def pivot_best_hits(best, column, queries, genomes):
+    """
+    Pivot a column of the best hits into a queries x genomes matrix.
+    
+    Args:
+        best (pd.DataFrame): Output of select_best_hits
+        column (str): Column to pivot
+        queries (list): Row order
+        genomes (list): Column order
+        
+    Returns:
+        pd.DataFrame: Matrix with NaN for combinations without a best hit
+    """
+    return best.pivot(index='query_id', columns='genome', values=column).reindex(index=queries, columns=genomes)
+
 def create_bubble_plot(data, protein_name, output_dir="visualizations"):
     """
     Create a bubble plot showing significance and quality of matches.
@@ -92,51 +113,28 @@ def create_bubble_plot(data, protein_name, output_dir="visualizations"):
     queries = sorted(data['query_id'].unique())
     genomes = sorted(data['genome'].unique())
     
-    # Create significance mapping
-    significance_map = {
-        'VERY HIGH (likely ortholog)': {'color': 'red', 'size': 200, 'alpha': 0.8},
-        'HIGH (likely ortholog)': {'color': 'orange', 'size': 150, 'alpha': 0.8},
-        'MEDIUM (likely homolog)': {'color': 'yellow', 'size': 100, 'alpha': 0.8},
-        'LOW (possible homolog)': {'color': 'green', 'size': 50, 'alpha': 0.8},
-        'NOT FOUND': {'color': 'gray', 'size': 10, 'alpha': 0.4}
-    }
-    
-    # Create the plot
-    for i, query in enumerate(queries):
-        for j, genome in enumerate(genomes):
-            # Get data for this query-genome combination
-            subset = data[(data['query_id'] == query) & (data['genome'] == genome)]
-            
-            if subset.empty:
-                # No data - plot as NOT FOUND
-                plt.scatter(j, i, s=10, c='gray', alpha=0.4, edgecolors='black', linewidth=0.5)
-                plt.text(j, i, 'NF', ha='center', va='center', fontsize=8, fontweight='bold')
-            else:
-                # Get the best hit (highest identity)
-                # Handle case where pident might be NaN
-                valid_subset = subset.dropna(subset=['pident'])
-                if not valid_subset.empty:
-                    best_hit = valid_subset.loc[valid_subset['pident'].idxmax()]
-                    significance = best_hit['significance']
-                    identity = best_hit['pident']
-                else:
-                    # All pident values are NaN
-                    significance = 'NOT FOUND'
-                    identity = 0
-                
-                # Get plot parameters
-                if significance in significance_map:
-                    params = significance_map[significance]
-                else:
-                    params = significance_map['NOT FOUND']
-                
-                # Plot the bubble
-                plt.scatter(j, i, s=params['size'], c=params['color'], 
-                           alpha=params['alpha'], edgecolors='black', linewidth=0.5)
-                
-                # Add identity text
-                plt.text(j, i, f'{identity:.1f}%', ha='center', va='center', 
-                        fontsize=8, fontweight='bold')
+    # Best hit per cell, and which cells have any data at all
+    best = select_best_hits(data)
+    identity_matrix = pivot_best_hits(best, 'pident', queries, genomes)
+    significance_matrix = pivot_best_hits(best, 'significance', queries, genomes)
+    has_data = data.groupby(['query_id', 'genome']).size().unstack().reindex(index=queries, columns=genomes).notna()
+    
+    # Cells without an identity are plotted as NOT FOUND (labelled NF if there is no data at all)
+    significance = significance_matrix.where(identity_matrix.notna(), 'NOT FOUND').to_numpy().ravel()
+    codes = pd.Categorical(significance, categories=SIGNIFICANCE_ORDER).codes
+    codes = np.where(codes < 0, NOT_FOUND_CODE, codes)
+    identity = identity_matrix.fillna(0).to_numpy().ravel()
+    labels = [f'{value:.1f}%' if present else 'NF'
+              for value, present in zip(identity, has_data.to_numpy().ravel())]
+    
+    # Create the plot with a single scatter call for all cells
+    x, y = np.meshgrid(range(len(genomes)), range(len(queries)))
+    plt.scatter(x.ravel(), y.ravel(), s=SIGNIFICANCE_SIZES[codes], c=SIGNIFICANCE_COLORS[codes],
+               alpha=SIGNIFICANCE_ALPHAS[codes], edgecolors='black', linewidth=0.5)
+    
+    # Add identity text
+    for xi, yi, label in zip(x.ravel(), y.ravel(), labels):
+        plt.text(xi, yi, label, ha='center', va='center', fontsize=8, fontweight='bold')
     
     # Customize the plot
     plt.xticks(range(len(genomes)), genomes, rotation=45, ha='right')
@@ -147,9 +145,8 @@ def create_bubble_plot(data, protein_name, output_dir="visualizations"):
     
     # Add legend
     legend_elements = []
-    for sig, params in significance_map.items():
-        legend_elements.append(plt.scatter([], [], s=params['size'], c=params['color'], 
-                                         alpha=params['alpha'], label=sig))
+    for sig, size, color, alpha in zip(SIGNIFICANCE_ORDER, SIGNIFICANCE_SIZES, SIGNIFICANCE_COLORS, SIGNIFICANCE_ALPHAS):
+        legend_elements.append(plt.scatter([], [], s=size, c=color, alpha=alpha, label=sig))
     
     plt.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
     
@@ -183,25 +180,9 @@ def create_heatmap(data, protein_name, output_dir="visualizations"):
     queries = sorted(data['query_id'].unique())
     genomes = sorted(data['genome'].unique())
     
-    # Create identity matrix
-    identity_matrix = np.zeros((len(queries), len(genomes)))
-    
-    for i, query in enumerate(queries):
-        for j, genome in enumerate(genomes):
-            # Get data for this query-genome combination
-            subset = data[(data['query_id'] == query) & (data['genome'] == genome)]
-            
-            if not subset.empty:
-                # Get the best hit (highest identity)
-                # Handle case where pident might be NaN
-                valid_subset = subset.dropna(subset=['pident'])
-                if not valid_subset.empty:
-                    best_hit = valid_subset.loc[valid_subset['pident'].idxmax()]
-                    identity_matrix[i, j] = best_hit['pident']
-                else:
-                    identity_matrix[i, j] = 0
-            else:
-                identity_matrix[i, j] = 0
+    # Create identity matrix (0 where there is no hit)
+    best = select_best_hits(data)
+    identity_matrix = pivot_best_hits(best, 'pident', queries, genomes).fillna(0).to_numpy()
     
     # Create the heatmap
     plt.figure(figsize=(12, 8))
@@ -279,9 +260,11 @@ def generate_all_visualizations(output_dir="output", viz_dir="visualizations"):
     print("Generating visualizations for all protein families...")
     print("=" * 60)
     
-    for protein in protein_families:
-        generate_visualizations_for_protein(protein, output_dir, viz_dir)
-        print()
+    # Each protein family is independent, so render them in parallel processes
+    with Pool(min(len(protein_families), os.cpu_count() or 1)) as pool:
+        pool.starmap(generate_visualizations_for_protein,
+                     [(protein, output_dir, viz_dir) for protein in protein_families])
+    print()
     
     print("All visualizations generated!")
 
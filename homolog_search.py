@@ -7,14 +7,20 @@ and parse its contents for use in bioinformatics workflows.
 """
 
 import argparse
+import copy
+import hashlib
+import pickle
 import yaml
+try:
+    from yaml import CSafeLoader as _YamlLoader  # libyaml C parser
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
 import os
 import sys
-import pandas as pd
 from pathlib import Path
 from Bio import SeqIO
 from extract_proteins import parse_gff3_and_extract_proteins
-from blastp import create_blast_database, run_blastp, parse_blast_results, analyze_blast_results
+from blastp import is_up_to_date, create_blast_database, create_diamond_database, run_blastp, run_blastp_parallel, run_diamond, parse_blast_results, read_query_proteins, analyze_blast_results, write_best_hits
 
 def load_settings(settings_file):
     """
@@ -33,12 +39,48 @@ def load_settings(settings_file):
     if not os.path.exists(settings_file):
         raise FileNotFoundError(f"Settings file not found: {settings_file}")
     
+    key = (os.path.abspath(settings_file), os.stat(settings_file).st_mtime_ns)
+    if key not in _settings_cache:
+        settings = _load_cached_settings(key)
+        if settings is None:
+            try:
+                with open(settings_file, 'r') as f:
+                    settings = yaml.load(f, Loader=_YamlLoader)
+            except yaml.YAMLError as e:
+                raise yaml.YAMLError(f"Error parsing YAML file {settings_file}: {e}")
+            _store_cached_settings(key, settings)
+        _settings_cache[key] = settings
+    # Callers fill in defaults, so never hand out the cached object itself
+    return copy.deepcopy(_settings_cache[key])
+
+
+# Parsed settings keyed on (absolute path, mtime), in memory and pickled on disk
+_settings_cache = {}
+SETTINGS_CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'homolog_search'
+
+
+def _settings_cache_file(key):
+    return SETTINGS_CACHE_DIR / f"{hashlib.blake2b(key[0].encode(), digest_size=16).hexdigest()}.pkl"
+
+
+def _load_cached_settings(key):
+    """Return settings pickled for this path and mtime, or None."""
     try:
-        with open(settings_file, 'r') as f:
-            settings = yaml.safe_load(f)
-        return settings
-    except yaml.YAMLError as e:
-        raise yaml.YAMLError(f"Error parsing YAML file {settings_file}: {e}")
+        with open(_settings_cache_file(key), 'rb') as f:
+            cached_key, settings = pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError, ValueError):
+        return None
+    return settings if cached_key == key else None
+
+
+def _store_cached_settings(key, settings):
+    """Pickle settings for later runs; the cache is best effort."""
+    try:
+        SETTINGS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(_settings_cache_file(key), 'wb') as f:
+            pickle.dump((key, settings), f)
+    except OSError:
+        pass
 
 
 def validate_settings(settings):
@@ -97,20 +139,29 @@ def print_settings_summary(settings):
         for key, value in settings['general'].items():
             print(f"  {key}: {value}")
 
-def homolog_search(settings):
+def prepare_search(settings):
     """
-    Perform homolog search using the settings.
-    """
-    print("Performing homolog search...")
-    print(f"Settings: {settings}")
+    Extract the genome's proteins and create the search database for a settings file.
+
+    Args:
+        settings (dict): Parsed settings dictionary; missing general settings are filled with defaults
 
+    Returns:
+        dict: Paths used by the search: 'query_file', 'query_name', 'output_dir', 'db_name'
+            and 'blast_output_file'
+    """
     # Extract settings
     locations = settings['locations']
     general = settings['general']
     
-    # Default settings
-    if 'n-cores' not in general:
-        general['n-cores'] = 1
+    # Query proteins file and its name (used in the output file names)
+    query_file = os.path.join(locations['input-dir'], locations['proteins-fasta'])
+    query_name = os.path.basename(query_file)
+    
+    # Default settings: let run_blastp pick the thread count when n-cores is unset
+    general.setdefault('n-cores', None)
+    general.setdefault('mt-mode', 1)
+    general.setdefault('search-tool', 'blastp')
         
     # Create output directory if it doesn't exist
 
@@ -125,44 +176,78 @@ def homolog_search(settings):
     print(f"  Species: {general['species']}")
     print(f"  Genome: {locations['genome-fasta']}")
 
-    # Extract proteins using settings
+    # Extract proteins using settings, unless the saved proteins are newer than the GFF3 and genome
     genome_name = general['species'].replace(' ', '_')
-    proteins = parse_gff3_and_extract_proteins(
-        locations['gff3-file'],
-        locations['genome-fasta'],
-        genome_name
-    )
-    # Save proteins to file
     genome_short = general['species-short']
     output_file = os.path.join(output_dir, f"{genome_short}_proteins.fasta")
-    if not os.path.exists(output_file):
+    if is_up_to_date(output_file, [locations['gff3-file'], locations['genome-fasta']]):
+        print(f"Proteins are up to date: {output_file}")
+    else:
+        proteins = parse_gff3_and_extract_proteins(
+            locations['gff3-file'],
+            locations['genome-fasta'],
+            genome_name
+        )
+        # Save proteins to file
         SeqIO.write(proteins, output_file, "fasta")
         print(f"Saved {len(proteins)} proteins to: {output_file}")
 
-    # Create BLAST database
-    create_blast_database(output_file, os.path.join(output_dir, f"{genome_short}_db"))
+    # Create the search database
+    db_name = os.path.join(output_dir, f"{genome_short}_db")
+    search_tool = general['search-tool']
+    if search_tool == 'diamond':
+        create_diamond_database(output_file, db_name)
+    else:
+        create_blast_database(output_file, db_name)
 
-    # Run BLASTP search
-    query_file = os.path.join(locations['input-dir'], locations['proteins-fasta'])
-    # get the name of the query file
-    query_name = os.path.basename(query_file)
-    blast_output_file = os.path.join(output_dir, f"{genome_short}_blastp_{query_name}.tsv")
-    run_blastp(query_file, os.path.join(output_dir, f"{genome_short}_db"), blast_output_file, 
-        evalue=general['evalue'], max_target_seqs=general['max-target-seqs'], n_cores=general['n-cores'])
+    return {
+        'query_file': query_file,
+        'query_name': query_name,
+        'output_dir': output_dir,
+        'db_name': db_name,
+        'blast_output_file': os.path.join(output_dir, f"{genome_short}_{search_tool}_{query_name}.tsv"),
+    }
+
+def homolog_search(settings):
+    """
+    Perform homolog search using the settings.
+    """
+    print("Performing homolog search...")
+    print(f"Settings: {settings}")
+
+    paths = prepare_search(settings)
+    general = settings['general']
+    query_file = paths['query_file']
+    db_name = paths['db_name']
+    blast_output_file = paths['blast_output_file']
+    search_tool = general['search-tool']
+
+    # Run the homology search (BLASTP by default, DIAMOND if requested)
+    if search_tool == 'diamond':
+        result = run_diamond(query_file, db_name, blast_output_file,
+            evalue=general['evalue'], max_target_seqs=general['max-target-seqs'], n_cores=general['n-cores'],
+            sensitivity=general.get('diamond-sensitivity', 'sensitive'))
+    elif general.get('split-queries', False):
+        result = run_blastp_parallel(query_file, db_name, blast_output_file,
+            evalue=general['evalue'], max_target_seqs=general['max-target-seqs'], n_workers=general['n-cores'])
+    else:
+        result = run_blastp(query_file, db_name, blast_output_file,
+            evalue=general['evalue'], max_target_seqs=general['max-target-seqs'], n_cores=general['n-cores'], mt_mode=general['mt-mode'])
+
+    # A failed search keeps the previous output in place; never report that as a result
+    if result is None:
+        raise RuntimeError(f"{search_tool} search failed: {blast_output_file}")
 
     # Parse BLAST results
-    blast_results = parse_blast_results(blast_output_file)
-    # Read the query file and convert to list so it can be reused multiple times
-    query_file = os.path.join(locations['input-dir'], locations['proteins-fasta'])
-    query_proteins = list(SeqIO.parse(query_file, "fasta"))  # Convert to list so it can be reused
+    blast_results = parse_blast_results(blast_output_file, evalue_cutoff=general['evalue'])
+    # Read the query proteins once; the same list is used for the whole analysis
+    query_proteins = read_query_proteins(query_file)
     # Analyze BLAST results
     best_hits = analyze_blast_results(blast_results, query_proteins)
     
     # Write best hits to file
-    summary_df = pd.DataFrame(best_hits)
-    summary_df = summary_df.T
-    summary_df.columns = ['query_id', 'subject_id', 'pident', 'length', 'mismatch', 'gapopen', 'qstart', 'qend', 'sstart', 'send', 'evalue', 'bitscore', 'qlen', 'slen', 'qcovs', 'significance']
-    summary_df.to_csv(os.path.join(output_dir, f"{genome_short}_best_hits_{query_name}.tsv"), index=False)
+    genome_short = general['species-short']
+    write_best_hits(best_hits, os.path.join(paths['output_dir'], f"{genome_short}_best_hits_{paths['query_name']}.tsv"))
     
 
 def main():
@@ -3,12 +3,16 @@
 Parse best hits results for a specific protein file across all genomes.
 """
 
+import io
 import os
+import re
+import sys
+import numpy as np
 import pandas as pd
-import glob
 from pathlib import Path
 import argparse
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 def find_best_hits_files(protein_name, output_dir="output"):
     """
@@ -23,19 +27,76 @@ def find_best_hits_files(protein_name, output_dir="output"):
     """
     best_hits_files = {}
     
-    # Get all genome directories
-    genome_dirs = [d for d in os.listdir(output_dir) 
-                   if os.path.isdir(os.path.join(output_dir, d))]
+    # One pass over the genome directories; the directory check uses the cached entry type
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            # Look for best hits file for this protein
+            candidate = os.path.join(entry.path, f"{entry.name}_best_hits_{protein_name}.tsv")
+            if os.path.isfile(candidate):
+                best_hits_files[entry.name] = candidate
     
-    for genome in genome_dirs:
-        # Look for best hits file for this protein
-        pattern = f"{genome}_best_hits_{protein_name}"
-        files = glob.glob(os.path.join(output_dir, genome, f"{pattern}.tsv"))
+    return best_hits_files
+
+# Column types of the best hits files written by homolog_search.py. Numeric
+# columns stay float64: they hold NaN for queries without hits.
+BEST_HITS_DTYPES = {
+    'query_id': str, 'subject_id': str, 'pident': 'float64', 'length': 'float64', 'mismatch': 'float64',
+    'gapopen': 'float64', 'qstart': 'float64', 'qend': 'float64', 'sstart': 'float64', 'send': 'float64',
+    'evalue': 'float64', 'bitscore': 'float64', 'qlen': 'float64', 'slen': 'float64', 'qcovs': 'float64',
+    'significance': 'category'
+}
+
+# Significance bucket of a class label; VERY LOW comes before LOW so it is not counted as LOW
+SIGNIFICANCE_BUCKET_PATTERN = re.compile(r'(HIGH|MEDIUM|VERY LOW|LOW|NOT FOUND)')
+SIGNIFICANCE_BUCKET_KEYS = {'HIGH': 'high', 'MEDIUM': 'medium', 'LOW': 'low',
+                            'VERY LOW': 'very_low', 'NOT FOUND': 'not_found'}
+
+def count_significance(significance):
+    """
+    Count significance classes with a single groupby pass over the categories.
+    
+    Each distinct label is matched once against SIGNIFICANCE_BUCKET_PATTERN,
+    so e.g. 'VERY HIGH' entries are included in the HIGH count, while
+    'VERY LOW' entries are only counted as VERY LOW.
+    
+    Args:
+        significance (pd.Series): Significance labels
         
-        if files:
-            best_hits_files[genome] = files[0]
+    Returns:
+        dict: Counts for HIGH, MEDIUM, LOW, VERY LOW and NOT FOUND
+    """
+    counts = significance.groupby(significance.astype('category'), observed=True).size()
+    buckets = counts.index.astype(str).str.extract(SIGNIFICANCE_BUCKET_PATTERN, expand=False)
+    totals = counts.groupby(buckets.to_numpy()).sum()
+    return {key: int(totals.get(bucket, 0)) for bucket, key in SIGNIFICANCE_BUCKET_KEYS.items()}
+
+def top_k_rows(df, column, k=5, largest=True):
+    """
+    Select the k rows with the largest (or smallest) values of a column.
     
-    return best_hits_files
+    Uses np.partition to find the k-th value in linear time and only sorts
+    the rows at or beyond it. Ties keep file order, like nlargest/nsmallest.
+    
+    Args:
+        df (pd.DataFrame): Data to select from
+        column (str): Column to rank by; NaN values are ignored
+        k (int): Number of rows to return
+        largest (bool): Select the largest values instead of the smallest
+        
+    Returns:
+        pd.DataFrame: Up to k rows ordered by the column
+    """
+    values = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    valid = np.flatnonzero(~np.isnan(values))
+    keys = -values[valid] if largest else values[valid]
+    if len(keys) > k:
+        kth = np.partition(keys, k - 1)[k - 1]
+        selected = keys <= kth
+        valid, keys = valid[selected], keys[selected]
+    order = np.argsort(keys, kind='stable')[:k]
+    return df.iloc[valid[order]]
 
 def parse_best_hits_file(file_path):
     """
@@ -48,8 +109,11 @@ def parse_best_hits_file(file_path):
         pd.DataFrame: Parsed data
     """
     try:
-        df = pd.read_csv(file_path)
-        return df
+        try:
+            # Arrow's multithreaded CSV reader, if pyarrow is installed
+            return pd.read_csv(file_path, engine='pyarrow', dtype=BEST_HITS_DTYPES)
+        except ImportError:
+            return pd.read_csv(file_path, dtype=BEST_HITS_DTYPES)
     except Exception as e:
         print(f"Error parsing {file_path}: {e}")
         return pd.DataFrame()
@@ -83,10 +147,14 @@ def analyze_protein_results(protein_name, output_dir="output"):
     all_results = []
     genome_stats = {}
     
+    # Read the files concurrently; read_csv releases the GIL while parsing
+    with ThreadPoolExecutor(max_workers=min(32, len(best_hits_files))) as executor:
+        parsed = dict(zip(best_hits_files, executor.map(parse_best_hits_file, best_hits_files.values())))
+    
     for genome, file_path in best_hits_files.items():
         print(f"\nProcessing {genome}...")
         
-        df = parse_best_hits_file(file_path)
+        df = parsed[genome]
         if df.empty:
             print(f"  No data found in {file_path}")
             continue
@@ -96,15 +164,17 @@ def analyze_protein_results(protein_name, output_dir="output"):
         all_results.append(df)
         
         # Calculate statistics for this genome
+        counts = count_significance(df['significance'])
+        has_hit = df['subject_id'].notna()
         stats = {
             'total_queries': len(df),
-            'queries_with_hits': len(df[df['subject_id'].notna()]),
-            'queries_no_hits': len(df[df['subject_id'].isna()]),
-            'high_significance': len(df[df['significance'].str.contains('HIGH', na=False)]),
-            'medium_significance': len(df[df['significance'].str.contains('MEDIUM', na=False)]),
-            'low_significance': len(df[df['significance'].str.contains('LOW', na=False)]),
-            'very_low_significance': len(df[df['significance'].str.contains('VERY LOW', na=False)]),
-            'not_found': len(df[df['significance'].str.contains('NOT FOUND', na=False)]),
+            'queries_with_hits': int(has_hit.sum()),
+            'queries_no_hits': int((~has_hit).sum()),
+            'high_significance': counts['high'],
+            'medium_significance': counts['medium'],
+            'low_significance': counts['low'],
+            'very_low_significance': counts['very_low'],
+            'not_found': counts['not_found'],
             'avg_identity': df['pident'].mean() if 'pident' in df.columns else None,
             'avg_evalue': df['evalue'].mean() if 'evalue' in df.columns else None,
             'avg_bitscore': df['bitscore'].mean() if 'bitscore' in df.columns else None
@@ -125,15 +195,17 @@ def analyze_protein_results(protein_name, output_dir="output"):
         combined_df = pd.concat(all_results, ignore_index=True)
         
         # Overall statistics
+        combined_df['significance'] = combined_df['significance'].astype('category')
+        counts = count_significance(combined_df['significance'])
         overall_stats = {
             'total_genomes': len(best_hits_files),
             'total_queries': len(combined_df),
-            'total_hits': len(combined_df[combined_df['subject_id'].notna()]),
-            'high_significance_total': len(combined_df[combined_df['significance'].str.contains('HIGH', na=False)]),
-            'medium_significance_total': len(combined_df[combined_df['significance'].str.contains('MEDIUM', na=False)]),
-            'low_significance_total': len(combined_df[combined_df['significance'].str.contains('LOW', na=False)]),
-            'very_low_significance_total': len(combined_df[combined_df['significance'].str.contains('VERY LOW', na=False)]),
-            'not_found_total': len(combined_df[combined_df['significance'].str.contains('NOT FOUND', na=False)])
+            'total_hits': int(combined_df['subject_id'].notna().sum()),
+            'high_significance_total': counts['high'],
+            'medium_significance_total': counts['medium'],
+            'low_significance_total': counts['low'],
+            'very_low_significance_total': counts['very_low'],
+            'not_found_total': counts['not_found']
         }
         
         return {
@@ -145,74 +217,81 @@ def analyze_protein_results(protein_name, output_dir="output"):
     
     return {}
 
-def generate_summary_report(analysis_results, protein_name):
+def generate_summary_report(analysis_results, protein_name, out=None):
     """
     Generate a comprehensive summary report.
     
     Args:
         analysis_results (dict): Results from analyze_protein_results
         protein_name (str): Name of the protein file
+        out (file-like): Stream to write the report to (default: sys.stdout)
     """
+    if out is None:
+        out = sys.stdout
     if not analysis_results:
-        print("No analysis results to report.")
+        print("No analysis results to report.", file=out)
         return
     
-    print(f"\n{'='*80}")
-    print(f"COMPREHENSIVE ANALYSIS REPORT FOR {protein_name.upper()}")
-    print(f"{'='*80}")
+    print(f"\n{'='*80}", file=out)
+    print(f"COMPREHENSIVE ANALYSIS REPORT FOR {protein_name.upper()}", file=out)
+    print(f"{'='*80}", file=out)
     
     # Overall statistics
     overall = analysis_results['overall_stats']
-    print(f"\nOVERALL STATISTICS:")
-    print(f"  Total genomes analyzed: {overall['total_genomes']}")
-    print(f"  Total queries: {overall['total_queries']}")
-    print(f"  Total hits found: {overall['total_hits']}")
-    print(f"  Hit rate: {overall['total_hits']/overall['total_queries']*100:.1f}%")
-    
-    print(f"\nSIGNIFICANCE BREAKDOWN:")
-    print(f"  HIGH (likely orthologs): {overall['high_significance_total']}")
-    print(f"  MEDIUM (likely homologs): {overall['medium_significance_total']}")
-    print(f"  LOW (possible homologs): {overall['low_significance_total']}")
-    print(f"  VERY LOW: {overall['very_low_significance_total']}")
-    print(f"  NOT FOUND: {overall['not_found_total']}")
+    print(f"\nOVERALL STATISTICS:", file=out)
+    print(f"  Total genomes analyzed: {overall['total_genomes']}", file=out)
+    print(f"  Total queries: {overall['total_queries']}", file=out)
+    print(f"  Total hits found: {overall['total_hits']}", file=out)
+    print(f"  Hit rate: {overall['total_hits']/overall['total_queries']*100:.1f}%", file=out)
+    
+    print(f"\nSIGNIFICANCE BREAKDOWN:", file=out)
+    print(f"  HIGH (likely orthologs): {overall['high_significance_total']}", file=out)
+    print(f"  MEDIUM (likely homologs): {overall['medium_significance_total']}", file=out)
+    print(f"  LOW (possible homologs): {overall['low_significance_total']}", file=out)
+    print(f"  VERY LOW: {overall['very_low_significance_total']}", file=out)
+    print(f"  NOT FOUND: {overall['not_found_total']}", file=out)
     
     # Per-genome breakdown
-    print(f"\nPER-GENOME BREAKDOWN:")
-    print(f"{'Genome':<20} {'Queries':<10} {'Hits':<8} {'High':<8} {'Med':<8} {'Low':<8}")
-    print("-" * 70)
+    print(f"\nPER-GENOME BREAKDOWN:", file=out)
+    print(f"{'Genome':<20} {'Queries':<10} {'Hits':<8} {'High':<8} {'Med':<8} {'Low':<8}", file=out)
+    print("-" * 70, file=out)
     
     for genome, stats in analysis_results['genome_stats'].items():
         print(f"{genome:<20} {stats['total_queries']:<10} {stats['queries_with_hits']:<8} "
-              f"{stats['high_significance']:<8} {stats['medium_significance']:<8} {stats['low_significance']:<8}")
+              f"{stats['high_significance']:<8} {stats['medium_significance']:<8} {stats['low_significance']:<8}", file=out)
     
     # Top hits analysis
-    print(f"\nTOP HITS ANALYSIS:")
+    print(f"\nTOP HITS ANALYSIS:", file=out)
     combined_df = analysis_results['combined_data']
     
     # Find highest identity hits
-    high_identity = combined_df[combined_df['pident'].notna()].nlargest(5, 'pident')
+    high_identity = top_k_rows(combined_df, 'pident', 5, largest=True)
     if not high_identity.empty:
-        print(f"\nTop 5 hits by identity:")
+        print(f"\nTop 5 hits by identity:", file=out)
         for _, row in high_identity.iterrows():
             print(f"  {row['query_id']} → {row['subject_id']} ({row['genome']}): "
-                  f"{row['pident']:.1f}% identity, E-value: {row['evalue']:.2e}")
+                  f"{row['pident']:.1f}% identity, E-value: {row['evalue']:.2e}", file=out)
     
     # Find lowest E-value hits
-    low_evalue = combined_df[combined_df['evalue'].notna()].nsmallest(5, 'evalue')
+    low_evalue = top_k_rows(combined_df, 'evalue', 5, largest=False)
     if not low_evalue.empty:
-        print(f"\nTop 5 hits by E-value:")
+        print(f"\nTop 5 hits by E-value:", file=out)
         for _, row in low_evalue.iterrows():
             print(f"  {row['query_id']} → {row['subject_id']} ({row['genome']}): "
-                  f"E-value: {row['evalue']:.2e}, {row['pident']:.1f}% identity")
+                  f"E-value: {row['evalue']:.2e}, {row['pident']:.1f}% identity", file=out)
 
-def save_analysis_results(analysis_results, protein_name, output_dir="analysis_output"):
+def save_analysis_results(analysis_results, protein_name, output_dir="analysis_output", legacy_tsv=False):
     """
     Save analysis results to files.
     
+    The combined data is written as Zstandard-compressed Parquet unless
+    legacy_tsv is set or no Parquet engine is installed.
+    
     Args:
         analysis_results (dict): Results from analyze_protein_results
         protein_name (str): Name of the protein file
         output_dir (str): Directory to save results
+        legacy_tsv (bool): Write the combined data as TSV instead of Parquet
     """
     if not analysis_results:
         return
@@ -221,8 +300,18 @@ def save_analysis_results(analysis_results, protein_name, output_dir="analysis_o
     os.makedirs(output_dir, exist_ok=True)
     
     # Save combined data
-    combined_file = os.path.join(output_dir, f"{protein_name.replace('.fasta', '')}_all_genomes_combined.tsv")
-    analysis_results['combined_data'].to_csv(combined_file, index=False, sep='\t')
+    combined_stem = os.path.join(output_dir, f"{protein_name.replace('.fasta', '')}_all_genomes_combined")
+    combined_file = None
+    if not legacy_tsv:
+        try:
+            combined_file = f"{combined_stem}.parquet"
+            analysis_results['combined_data'].to_parquet(combined_file, compression='zstd', index=False)
+        except ImportError:
+            print("\nNo Parquet engine (pyarrow or fastparquet) installed, writing TSV instead")
+            combined_file = None
+    if combined_file is None:
+        combined_file = f"{combined_stem}.tsv"
+        analysis_results['combined_data'].to_csv(combined_file, index=False, sep='\t')
     print(f"\nCombined data saved to: {combined_file}")
     
     # Save genome statistics
@@ -233,15 +322,9 @@ def save_analysis_results(analysis_results, protein_name, output_dir="analysis_o
     
     # Save summary report
     report_file = os.path.join(output_dir, f"{protein_name.replace('.fasta', '')}_analysis_report.txt")
-    with open(report_file, 'w') as f:
-        # Redirect print output to file
-        import sys
-        original_stdout = sys.stdout
-        sys.stdout = f
-        
-        generate_summary_report(analysis_results, protein_name)
-        
-        sys.stdout = original_stdout
+    report = io.StringIO()
+    generate_summary_report(analysis_results, protein_name, out=report)
+    Path(report_file).write_text(report.getvalue())
     
     print(f"Analysis report saved to: {report_file}")
 
@@ -278,6 +361,12 @@ def main():
         help='Save analysis results to files'
     )
     
+    parser.add_argument(
+        '--legacy-tsv',
+        action='store_true',
+        help='Save the combined data as TSV instead of Parquet'
+    )
+    
     args = parser.parse_args()
     
     # Analyze results
@@ -289,7 +378,7 @@ def main():
         
         # Save results if requested
         if args.save_results:
-            save_analysis_results(results, args.protein_name, args.analysis_output)
+            save_analysis_results(results, args.protein_name, args.analysis_output, args.legacy_tsv)
     else:
         print(f"No results found for {args.protein_name}")
 
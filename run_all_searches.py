@@ -4,9 +4,42 @@ Run homolog searches for all settings files.
 """
 
 import os
-import subprocess
-import glob
+import signal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
 from pathlib import Path
+from blastp import default_num_threads, blastp_params, blast_results_up_to_date, run_blastp_batch
+from homolog_search import homolog_search, load_settings, prepare_search
+
+class SearchTimeout(BaseException):
+    """Raised when a homolog search runs longer than its time limit.
+
+    A BaseException so that the `except Exception` handlers around BLAST
+    cannot swallow it and let a truncated search pass as a success.
+    """
+
+def _search_timeout(signum, frame):
+    raise SearchTimeout()
+
+class TailBuffer:
+    """Text stream that keeps only the last lines written to it."""
+
+    def __init__(self, max_lines=20):
+        self.lines = deque(maxlen=max_lines)
+        self.partial = ''
+
+    def write(self, text):
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+        self.lines.extend(line + '\n' for line in lines)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self.lines) + self.partial
 
 def run_homolog_search(settings_file):
     """Run homolog search for a single settings file."""
@@ -14,29 +47,95 @@ def run_homolog_search(settings_file):
     print(f"Running homolog search for: {settings_file}")
     print(f"{'='*80}")
     
+    # Stop the search after 1 hour; the running BLAST processes are killed when the alarm interrupts them
+    previous_handler = signal.signal(signal.SIGALRM, _search_timeout)
+    signal.alarm(3600)
+    # Keep only the tail of the search's output, as for the former child process
+    tail = TailBuffer()
     try:
-        # Run the homolog search
-        result = subprocess.run([
-            'python', 'homolog_search.py', 
-            '--settings', settings_file
-        ], capture_output=True, text=True, timeout=3600)  # 1 hour timeout
-        
-        if result.returncode == 0:
-            print(f"✓ SUCCESS: {settings_file}")
-            if result.stdout:
-                print("Output:", result.stdout[-500:])  # Last 500 chars
-        else:
-            print(f"✗ FAILED: {settings_file}")
-            print("Error:", result.stderr[-500:] if result.stderr else "Unknown error")
-            
-        return result.returncode == 0
+        # Run the homolog search in this process, reusing the already imported modules
+        with redirect_stdout(tail):
+            homolog_search(load_settings(settings_file))
+        print(f"✓ SUCCESS: {settings_file}")
+        output = tail.getvalue()
+        if output:
+            print("Output:", output[-500:])  # Last 500 chars
+        return True
         
-    except subprocess.TimeoutExpired:
+    except SearchTimeout:
         print(f"⏰ TIMEOUT: {settings_file} (took longer than 1 hour)")
+        print("Output:", tail.getvalue()[-500:])
         return False
     except Exception as e:
         print(f"💥 ERROR: {settings_file} - {str(e)}")
+        print("Output:", tail.getvalue()[-500:])
         return False
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+def read_general_settings(settings_file):
+    """Return the (output-dir, species-short) of a settings file and its BLAST thread count."""
+    settings = load_settings(settings_file) or {}
+    general = settings.get('general', {})
+    genome_key = (settings.get('locations', {}).get('output-dir'), general.get('species-short'))
+    return genome_key, general.get('n-cores') or default_num_threads()
+
+def run_blastp_batches(settings_files):
+    """Run one BLASTP search per genome for all settings files that share the search parameters.
+
+    The per-file searches afterwards find their BLAST results up to date and only run the analysis.
+    Searches that use DIAMOND, split-queries or different parameters are left to run_homolog_search.
+    """
+    batches = {}
+    tail = TailBuffer()
+    with redirect_stdout(tail):
+        for settings_file in settings_files:
+            settings = load_settings(settings_file)
+            paths = prepare_search(settings)
+            general = settings['general']
+            if general['search-tool'] != 'blastp' or general.get('split-queries', False):
+                continue
+            params = blastp_params(general['evalue'], general['max-target-seqs'], general['mt-mode'])
+            if blast_results_up_to_date(paths['blast_output_file'], paths['query_file'], paths['db_name'], params):
+                continue
+            batch_key = (paths['db_name'], general['evalue'], general['max-target-seqs'],
+                         general['n-cores'], general['mt-mode'])
+            batches.setdefault(batch_key, []).append(paths)
+
+    for (db_name, evalue, max_target_seqs, n_cores, mt_mode), batch in batches.items():
+        if len(batch) < 2:
+            continue
+        # Same limit as the searches it replaces: 1 hour per query file
+        previous_handler = signal.signal(signal.SIGALRM, _search_timeout)
+        signal.alarm(3600 * len(batch))
+        tail = TailBuffer()
+        try:
+            with redirect_stdout(tail):
+                run_blastp_batch([paths['query_file'] for paths in batch], db_name,
+                                 [paths['blast_output_file'] for paths in batch],
+                                 evalue=evalue, max_target_seqs=max_target_seqs, n_cores=n_cores, mt_mode=mt_mode)
+        except SearchTimeout:
+            print(f"⏰ TIMEOUT: batched BLASTP search against {db_name}")
+            print("Output:", tail.getvalue()[-500:])
+        except Exception as e:
+            print(f"💥 ERROR: batched BLASTP search against {db_name} - {str(e)}")
+            print("Output:", tail.getvalue()[-500:])
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+def run_homolog_search_group(settings_files):
+    """Run searches that share a genome one after another (they share the protein FASTA and database).
+
+    Query files that can share a BLASTP search are searched together first; files whose batched
+    search failed are searched on their own by run_homolog_search.
+    """
+    try:
+        run_blastp_batches(settings_files)
+    except Exception as e:
+        print(f"💥 ERROR: preparing batched BLASTP searches - {str(e)}")
+    return [run_homolog_search(settings_file) for settings_file in settings_files]
 
 def main():
     """Main function to run all homolog searches."""
@@ -48,24 +147,29 @@ def main():
     print(f"Found {len(settings_files)} settings files to process")
     print("Starting homolog searches...")
     
-    # Track results
-    successful = 0
-    failed = 0
+    # Searches against the same genome run in one worker; different genomes run in parallel,
+    # without oversubscribing the cores with BLAST threads
+    groups = {}
+    max_cores = 1
+    for settings_file in settings_files:
+        genome_key, n_cores = read_general_settings(settings_file)
+        groups.setdefault(genome_key, []).append(settings_file)
+        max_cores = max(max_cores, n_cores)
+    n_workers = max(1, min(len(groups), (os.cpu_count() or 1) // max_cores))
+    print(f"Running {len(groups)} genomes with up to {n_workers} in parallel")
     
     # Run searches
-    for i, settings_file in enumerate(settings_files, 1):
-        print(f"\n[{i}/{len(settings_files)}] Processing {settings_file.name}")
-        
-        success = run_homolog_search(str(settings_file))
-        
-        if success:
-            successful += 1
-        else:
-            failed += 1
-        
-        # Small delay between runs to avoid overwhelming the system
-        import time
-        time.sleep(2)
+    failed_files = []
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(run_homolog_search_group, [str(f) for f in group]): group
+                   for group in groups.values()}
+        for i, future in enumerate(as_completed(futures), 1):
+            group = futures[future]
+            print(f"\n[{i}/{len(groups)}] Finished {', '.join(f.name for f in group)}")
+            failed_files += [f for f, success in zip(group, future.result()) if not success]
+    
+    successful = len(settings_files) - len(failed_files)
+    failed = len(failed_files)
     
     # Summary
     print(f"\n{'='*80}")
@@ -74,13 +178,13 @@ def main():
     print(f"Total settings files: {len(settings_files)}")
     print(f"Successful: {successful}")
     print(f"Failed: {failed}")
-    print(f"Success rate: {successful/len(settings_files)*100:.1f}%")
+    if settings_files:
+        print(f"Success rate: {successful/len(settings_files)*100:.1f}%")
     
     if failed > 0:
         print(f"\nFailed files:")
-        for settings_file in settings_files:
-            if not run_homolog_search(str(settings_file)):
-                print(f"  - {settings_file.name}")
+        for settings_file in failed_files:
+            print(f"  - {settings_file.name}")
 
 if __name__ == "__main__":
     main()
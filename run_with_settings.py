@@ -8,19 +8,12 @@ import yaml
 import os
 import sys
 from extract_proteins import parse_gff3_and_extract_proteins
+from homolog_search import load_settings
+from blastp import default_num_threads
 from Bio import SeqIO
 import subprocess
 
 
-def load_settings(settings_file):
-    """Load and parse settings from a YAML file."""
-    if not os.path.exists(settings_file):
-        raise FileNotFoundError(f"Settings file not found: {settings_file}")
-    
-    with open(settings_file, 'r') as f:
-        return yaml.safe_load(f)
-
-
 def run_workflow_with_settings(settings):
     """
     Run the main workflow using settings from YAML file.
@@ -81,7 +74,8 @@ def run_workflow_with_settings(settings):
             '-out', blast_output,
             '-outfmt', '6 qseqid sseqid pident length mismatch gapopen qstart qend sstart send evalue bitscore stitle',
             '-evalue', str(general['evalue']),
-            '-max_target_seqs', str(general['max-target-seqs'])
+            '-max_target_seqs', str(general['max-target-seqs']),
+            '-num_threads', str(general.get('n-cores') or default_num_threads())
         ], check=True)
         
         print(f"BLAST results saved to: {blast_output}")
@@ -3,92 +3,30 @@
 Update genome performance and protein families summary files.
 """
 
-import pandas as pd
-import glob
 import os
+from _summary_core import (load_summaries, outputs_up_to_date, write_summary_files,
+                           GENOME_SUMMARY_FILE, PROTEIN_SUMMARY_FILE)
 
-def update_summary_files():
-    """Update the summary files with current data."""
-    
-    # Read all genome statistics files
-    stats_files = glob.glob('analysis_output/*_genome_statistics.tsv')
-    all_stats = []
+# Files written by this script
+SUMMARY_FILES = [os.path.join('analysis_output', GENOME_SUMMARY_FILE),
+                 os.path.join('analysis_output', PROTEIN_SUMMARY_FILE)]
 
-    for file in stats_files:
-        protein = os.path.basename(file).replace('_genome_statistics.tsv', '')
-        df = pd.read_csv(file, sep='\t', index_col=0)
-        df['protein_family'] = protein
-        all_stats.append(df)
+def update_summary_files(summaries=None):
+    """
+    Update the summary files with current data.
 
-    # Combine all statistics
-    combined_stats = pd.concat(all_stats)
+    Args:
+        summaries (tuple): (protein_df, genome_df) from compute_summaries;
+            loaded from analysis_output/ when not given
+    """
 
-    # Create genome performance summary
-    genome_performance = []
-    genomes = sorted(combined_stats.index.unique())
-    
-    for genome in genomes:
-        subset = combined_stats.loc[genome]
-        total_queries = subset['total_queries'].sum()
-        total_hits = subset['queries_with_hits'].sum()
-        high_orthologs = subset['high_significance'].sum()
-        medium_homologs = subset['medium_significance'].sum()
-        low_possible = subset['low_significance'].sum()
-        very_low = subset['very_low_significance'].sum()
-        not_found = subset['not_found'].sum()
-        avg_identity = subset['avg_identity'].mean()
-        proteins_analyzed = len(subset)
-        hit_rate = (total_hits / total_queries * 100) if total_queries > 0 else 0
-        
-        genome_performance.append({
-            'Total_Queries': total_queries,
-            'Total_Hits': total_hits,
-            'HIGH_Orthologs': high_orthologs,
-            'MEDIUM_Homologs': medium_homologs,
-            'LOW_Possible': low_possible,
-            'VERY_LOW': very_low,
-            'NOT_FOUND': not_found,
-            'Avg_Identity_%': avg_identity,
-            'Proteins_Analyzed': proteins_analyzed,
-            'Hit_Rate_%': hit_rate
-        })
-    
-    genome_perf_df = pd.DataFrame(genome_performance, index=genomes)
-    genome_perf_df.to_csv('analysis_output/genome_performance_summary.tsv', sep='\t')
-    
-    # Create protein families summary
-    protein_families = []
-    for protein in sorted(combined_stats['protein_family'].unique()):
-        subset = combined_stats[combined_stats['protein_family'] == protein]
-        total_queries = subset['total_queries'].sum()
-        total_hits = subset['queries_with_hits'].sum()
-        hit_rate = (total_hits / total_queries * 100) if total_queries > 0 else 0
-        high_orthologs = subset['high_significance'].sum()
-        medium_homologs = subset['medium_significance'].sum()
-        low_possible = subset['low_significance'].sum()
-        very_low = subset['very_low_significance'].sum()
-        not_found = subset['not_found'].sum()
-        avg_identity = subset['avg_identity'].mean()
-        
-        protein_families.append({
-            'Protein_Family': protein,
-            'Total_Queries': total_queries,
-            'Total_Hits': total_hits,
-            'Hit_Rate_%': hit_rate,
-            'HIGH_Orthologs': high_orthologs,
-            'MEDIUM_Homologs': medium_homologs,
-            'LOW_Possible': low_possible,
-            'VERY_LOW': very_low,
-            'NOT_FOUND': not_found,
-            'Avg_Identity_%': avg_identity
-        })
-    
-    protein_fam_df = pd.DataFrame(protein_families)
-    protein_fam_df.to_csv('analysis_output/protein_families_summary.tsv', sep='\t', index=False)
-    
-    print("Summary files updated!")
-    print(f"Genome performance summary: {len(genomes)} genomes")
-    print(f"Protein families summary: {len(protein_families)} families")
+    # Read all genome statistics files and aggregate them, unless already done by the caller
+    if summaries is None:
+        if outputs_up_to_date(SUMMARY_FILES, 'analysis_output'):
+            print("Summaries are up to date")
+            return
+        summaries = load_summaries('analysis_output')
+    write_summary_files(summaries, 'analysis_output')
 
 if __name__ == "__main__":
     update_summary_files()